@@ -3,98 +3,252 @@ Analytics module for tracking CAPTCHA bypass metrics.
 Stores success/failure rates and response times in SQLite.
 Provides recommendations for optimal bypass method.
 """
+import itertools
 import sqlite3
-from datetime import datetime
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
 import texttable
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+# Number of buffered events written per transaction
+FLUSH_EVERY = 64
+# Seconds for which aggregated statistics and recommendations are reused
+STATS_TTL = 15.0
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-64000;",
+    "PRAGMA mmap_size=268435456;",
+)
+
+CREATE_METRICS = """
+    CREATE TABLE IF NOT EXISTS captcha_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT NOT NULL,
+        success INTEGER NOT NULL,
+        response_time REAL,
+        error_message TEXT,
+        timestamp INTEGER NOT NULL
+    )
+"""
+
+INSERT_PREFIX = "INSERT INTO captcha_metrics (method, success, response_time, error_message, timestamp) VALUES "
+ROW_PLACEHOLDER = "(?, ?, ?, ?, ?)"
+# Rows per statement; 5 parameters per row keeps us under SQLite's 999-variable limit
+MAX_ROWS_PER_INSERT = 190
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _timestamp_ns(value: Any) -> int:
+    """Convert a stored timestamp to nanoseconds since the epoch.
+
+    Accepts epoch nanoseconds (as int or digit string) and the ISO-8601 UTC
+    strings written by older versions; unparseable values become 0.
+    """
+    if isinstance(value, int):
+        return value
+    text = str(value)
+    if text.isdigit():
+        return int(text)
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1) * 1000
+
+def _write_rows(conn: sqlite3.Connection, buf: List[tuple]) -> None:
+    """Insert the buffered rows in ``buf`` in a single transaction, then empty it.
+
+    Rows are inserted with multi-row ``VALUES`` statements so the whole
+    batch costs a handful of statement executions and one commit.
+    """
+    if not buf:
+        return
+    conn.execute("BEGIN")
+    try:
+        for start in range(0, len(buf), MAX_ROWS_PER_INSERT):
+            chunk = buf[start:start + MAX_ROWS_PER_INSERT]
+            sql = INSERT_PREFIX + ",".join([ROW_PLACEHOLDER] * len(chunk))
+            conn.execute(sql, list(itertools.chain.from_iterable(chunk)))
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    buf.clear()
 
 class Analytics:
     """Manages CAPTCHA bypass metrics and recommendations."""
-    def __init__(self, db_path: str = "./analytics.sqlite"):
-        """Initialise analytics with SQLite database."""
+    def __init__(self, db_path: str = "./analytics.sqlite", flush_every: int = FLUSH_EVERY,
+                 stats_ttl: float = STATS_TTL):
+        """Initialise analytics with a persistent SQLite connection."""
         self.db_path = db_path
+        self.flush_every = flush_every
+        self._buf: List[tuple] = []
+        self._stats_ttl = stats_ttl
+        self._stats_cache: Optional[Dict[str, Any]] = None
+        self._stats_cache_ts = 0.0
+        self._recommend_cache: Optional[str] = None
+        self._recommend_cache_ts = 0.0
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(
+            db_path, isolation_level=None, check_same_thread=False
+        )
+        for pragma in PRAGMAS:
+            self._conn.execute(pragma)
         self._init_db()
+        # Persist whatever is still buffered at exit or when the collector is
+        # garbage-collected; holds no reference to self
+        self._finalizer = weakref.finalize(self, _write_rows, self._conn, self._buf)
 
     def _init_db(self):
-        """Create SQLite table for storing CAPTCHA metrics."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS captcha_metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                method TEXT NOT NULL,
-                success INTEGER NOT NULL,
-                response_time REAL,
-                error_message TEXT,
-                timestamp TEXT NOT NULL
+        """Create SQLite table for storing CAPTCHA metrics.
+
+        ``timestamp`` holds nanoseconds since the epoch (``time.time_ns()``);
+        convert with ``datetime.fromtimestamp(ts / 1e9, tz=timezone.utc)``
+        when displaying.  Databases created with the older ``TEXT`` column
+        are migrated on open.
+        """
+        self._conn.execute(CREATE_METRICS)
+        columns = {row[1]: row[2] for row in self._conn.execute("PRAGMA table_info(captcha_metrics)")}
+        if columns["timestamp"].upper() != "INTEGER":
+            self._migrate_timestamps()
+        # Covering index: the per-method aggregations never touch table pages
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_metrics_method_success_rt "
+            "ON captcha_metrics (method, success, response_time)"
+        )
+
+    def _migrate_timestamps(self):
+        """Rebuild a legacy table whose ``timestamp`` column is ``TEXT``.
+
+        Converts its ISO-8601 strings (and any epoch digits stored as text)
+        to integer epoch nanoseconds, keeping row ids, in one transaction.
+        """
+        rows = self._conn.execute(
+            "SELECT id, method, success, response_time, error_message, timestamp FROM captcha_metrics"
+        ).fetchall()
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute("ALTER TABLE captcha_metrics RENAME TO captcha_metrics_legacy")
+            self._conn.execute(CREATE_METRICS)
+            self._conn.executemany(
+                "INSERT INTO captcha_metrics (id, method, success, response_time, error_message, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [row[:5] + (_timestamp_ns(row[5]),) for row in rows],
             )
-        """)
-        conn.commit()
-        conn.close()
+            # Also drops the legacy table's indexes; _init_db recreates them
+            self._conn.execute("DROP TABLE captcha_metrics_legacy")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def flush(self):
+        """Write buffered events to the database in a single transaction."""
+        if not self._buf or self._conn is None:
+            return
+        batch_size = len(self._buf)
+        _write_rows(self._conn, self._buf)
+        # Small batches barely move the aggregates; let the cache age out instead
+        if batch_size >= self.flush_every:
+            self._invalidate_stats()
+
+    def _invalidate_stats(self):
+        """Drop cached statistics so the next read re-aggregates."""
+        self._stats_cache = None
+        self._recommend_cache = None
+
+    def _append(self, row: tuple):
+        """Buffer an event and flush once the batch is full."""
+        self._buf.append(row)
+        if len(self._buf) >= self.flush_every:
+            self.flush()
 
     def log_success(self, method: str, response_time: float):
         """Record a successful CAPTCHA bypass attempt."""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.execute(
-                "INSERT INTO captcha_metrics (method, success, response_time, timestamp) VALUES (?, ?, ?, ?)",
-                (method, 1, response_time, datetime.utcnow().isoformat() + "Z")
-            )
-            conn.commit()
-        finally:
-            conn.close()
+        self._append((method, 1, response_time, None, time.time_ns()))
 
     def log_failure(self, method: str, error_message: str):
         """Record a failed CAPTCHA bypass attempt."""
-        conn = sqlite3.connect(self.db_path)
+        self._append((method, 0, None, error_message, time.time_ns()))
+
+    def close(self):
+        """Flush pending events and close the database connection."""
+        if self._conn is None:
+            return
+        self.flush()
+        self._finalizer.detach()
+        self._conn.close()
+        self._conn = None
+
+    def __del__(self):
         try:
-            conn.execute(
-                "INSERT INTO captcha_metrics (method, success, error_message, timestamp) VALUES (?, ?, ?, ?)",
-                (method, 0, error_message, datetime.utcnow().isoformat() + "Z")
-            )
-            conn.commit()
-        finally:
-            conn.close()
+            self.close()
+        except Exception:
+            pass
 
     def get_stats(self) -> dict:
-        """Retrieve aggregated CAPTCHA bypass statistics."""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            cursor = conn.execute("""
-                SELECT method, 
-                       COUNT(*) as attempts,
-                       SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successes,
-                       AVG(response_time) as avg_time
-                FROM captcha_metrics
-                GROUP BY method
-            """)
-            stats = {}
-            for row in cursor:
-                method, attempts, successes, avg_time = row
-                stats[method] = {
-                    "attempts": attempts,
-                    "success_rate": successes / attempts if attempts > 0 else 0,
-                    "avg_time": avg_time or 0
-                }
-            return stats
-        finally:
-            conn.close()
+        """Retrieve aggregated CAPTCHA bypass statistics.
+
+        Results are cached for ``stats_ttl`` seconds; callers tolerate
+        slightly stale aggregates in exchange for skipping the table scan.
+        """
+        now = time.monotonic()
+        if self._stats_cache is not None and now - self._stats_cache_ts < self._stats_ttl:
+            return self._stats_cache
+        self.flush()
+        cursor = self._conn.execute("""
+            SELECT method,
+                   COUNT(*) as attempts,
+                   SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successes,
+                   AVG(response_time) as avg_time
+            FROM captcha_metrics
+            GROUP BY method
+        """)
+        stats = {}
+        for row in cursor:
+            method, attempts, successes, avg_time = row
+            stats[method] = {
+                "attempts": attempts,
+                "success_rate": successes / attempts if attempts > 0 else 0,
+                "avg_time": avg_time or 0
+            }
+        self._stats_cache = stats
+        self._stats_cache_ts = now
+        return stats
 
     def recommend_method(self) -> str:
-        """Recommend the optimal CAPTCHA bypass method."""
-        stats = self.get_stats()
-        if not stats:
-            return "pow"  # Default to PoW for initial runs
-        best_method = "pow"
-        best_score = -1
-        for method, data in stats.items():
-            score = data["success_rate"] / (data["avg_time"] or 1)  # Prioritise high success, low time
-            if score > best_score:
-                best_score = score
-                best_method = method
-        return best_method
+        """Recommend the optimal CAPTCHA bypass method (memoised for ``stats_ttl`` seconds)."""
+        now = time.monotonic()
+        if self._recommend_cache is not None and now - self._recommend_cache_ts < self._stats_ttl:
+            return self._recommend_cache
+        self._recommend_cache = self._compute_recommendation()
+        self._recommend_cache_ts = now
+        return self._recommend_cache
+
+    def _compute_recommendation(self) -> str:
+        """Pick the method with the best success rate per second of latency."""
+        self.flush()
+        # Prioritise high success, low time; ties resolve alphabetically
+        row = self._conn.execute("""
+            SELECT method
+            FROM captcha_metrics
+            GROUP BY method
+            ORDER BY (CAST(SUM(success) AS REAL) / COUNT(*))
+                     / COALESCE(NULLIF(AVG(response_time), 0), 1) DESC,
+                     method
+            LIMIT 1
+        """).fetchone()
+        return row[0] if row else "pow"  # Default to PoW for initial runs
 
     def print_stats(self):
         """Display a table of CAPTCHA bypass statistics."""
+        self.flush()
+        self._invalidate_stats()
         stats = self.get_stats()
         table = texttable.Texttable()
         table.header(["Method", "Attempts", "Success Rate", "Avg Time (s)"])
@@ -107,4 +261,4 @@ class Analytics:
             ])
         print("\nCAPTCHA Bypass Statistics:")
         print(table.draw())
-        print(f"Recommended Method: {self.recommend_method()}")
\ No newline at end of file
+        print(f"Recommended Method: {self.recommend_method()}")
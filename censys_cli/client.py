@@ -7,8 +7,11 @@ import time
 import random
 from typing import Optional, Tuple, List, Dict, Any
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
+from .utils import fastjson
+
 DEFAULT_BASE = "https://search.censys.io/api"
 ENDPOINTS = {
     "hosts": "/v2/hosts/search",
@@ -34,6 +37,14 @@ class CensysClient:
         self.logger = logger
         self.max_retries = max_retries
         self.backoff_base = backoff_base
+        # Base wait per attempt; jitter is added with a single random() draw
+        self._backoff = [backoff_base * (1 << a) for a in range(max_retries + 1)]
+        # One pooled keep-alive session so pages reuse the TCP/TLS connection;
+        # headers and auth are fixed for the client's lifetime, so build them once
+        self._session = requests.Session()
+        self._session.headers.update(self._headers())
+        self._session.auth = self._auth()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
 
     def _headers(self) -> Dict[str, str]:
         """Generate HTTP headers for API requests."""
@@ -57,35 +68,40 @@ class CensysClient:
     def _request(self, method: str, path: str, json_body: Dict[str, Any]) -> Dict[str, Any]:
         """Execute HTTP request with retry and backoff for rate limits and errors."""
         url = f"{self.base_url}{path}"
-        headers = self._headers()
-        auth = self._auth()
         last_err = None
         for attempt in range(self.max_retries + 1):
             try:
-                resp = requests.request(method, url, headers=headers, auth=auth, timeout=self.timeout, json=json_body)
-                if resp.status_code == 429:
+                resp = self._session.request(method, url, timeout=self.timeout, json=json_body)
+                status = resp.status_code
+                # Fast path: decode the body once, without raise_for_status()
+                if status < 400:
+                    return fastjson.loads(resp.content)
+                if status == 429:
                     retry_after = resp.headers.get("Retry-After")
-                    wait = float(retry_after) if retry_after else (self.backoff_base * (2 ** attempt) + random.uniform(0, 0.4))
+                    wait = float(retry_after) if retry_after else (self._backoff[attempt] + random.random() * 0.4)
                     if self.logger:
                         self.logger.warning("rate_limited", extra={"attempt": attempt, "wait": wait})
                     time.sleep(wait)
                     continue
-                if 500 <= resp.status_code < 600:
-                    wait = self.backoff_base * (2 ** attempt) + random.uniform(0, 0.5)
+                if 500 <= status < 600:
+                    wait = self._backoff[attempt] + random.random() * 0.5
                     if self.logger:
-                        self.logger.warning("server_error", extra={"status": resp.status_code, "attempt": attempt, "wait": wait})
+                        self.logger.warning("server_error", extra={"status": status, "attempt": attempt, "wait": wait})
                     time.sleep(wait)
                     continue
-                resp.raise_for_status()
-                return resp.json()
-            except requests.RequestException as e:
+                raise requests.HTTPError(f"{status} Error for url: {url}: {resp.content[:200]!r}", response=resp)
+            except (requests.RequestException, fastjson.JSONDecodeError) as e:
                 last_err = str(e)
-                wait = self.backoff_base * (2 ** attempt) + random.uniform(0, 0.5)
+                wait = self._backoff[attempt] + random.random() * 0.5
                 if self.logger:
                     self.logger.warning("request_exception", extra={"error": last_err, "attempt": attempt, "wait": wait})
                 time.sleep(wait)
         raise RuntimeError(f"Request failed after {self.max_retries} retries: {last_err}")
 
+    def close(self) -> None:
+        """Release the pooled HTTP connections."""
+        self._session.close()
+
     def search(self, index: str, query: str, per_page: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """Search the specified index with the given query."""
         if index not in ENDPOINTS:
@@ -6,6 +6,7 @@ Integrates ML-based prediction for optimal CAPTCHA bypass method.
 Outputs results in NDJSON or CSV format.
 """
 import argparse
+import atexit
 import os
 import sys
 import json
@@ -13,18 +14,30 @@ import pathlib
 import subprocess
 import shutil
 import csv
+import itertools
+import logging
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .client import CensysClient
+from .utils import fastjson
 from .utils.flatten import FlattenHelper
 from .utils.log import get_logger
 from .utils.io import ensure_parent
-from .utils.state import make_job_id, get_state, upsert_state
+from .utils.state import make_job_id, make_legacy_job_id, get_state, open_db, upsert_state, StateCheckpoint
 from .analytics import Analytics
 from .ml_predictor import MLPredictor
 
 DEFAULT_PAGE_SIZE = 100
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Pages fetched ahead of the writer
+PREFETCH_PAGES = 2
+_PREFETCH_DONE = object()
+# Node script driving the browser fallback; its location never changes
+_BROWSER_SCRIPT = str(pathlib.Path(__file__).resolve().parent.parent / "browser_automation.js")
 
 def parse_args() -> argparse.Namespace:
     """Parse and validate command-line arguments."""
@@ -49,6 +62,7 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--force-browser", action="store_true", help="Force browser-based fallback.")
     parser.add_argument("--analytics", action="store_true", help="Enable CAPTCHA analytics output.")
     parser.add_argument("--ml-predict", action="store_true", help="Use ML to predict optimal CAPTCHA bypass method.")
+    parser.add_argument("--ml-rf", action="store_true", help="With --ml-predict, use the Random Forest model (requires scikit-learn).")
     args = parser.parse_args()
     args.fields = [f.strip() for f in args.fields.split(",")] if args.fields else None
     # The state database can be overridden via environment variable for testing
@@ -84,23 +98,17 @@ def run_browser_fallback(query: str, fmt: str, output: Optional[str] = None,
         print(f"[INFO] Using {method} for browser fallback (ML recommendation).")
     else:
         print("[INFO] Using default PoW for browser fallback.")
-    # Locate the browser automation script relative to this file
-    script_path = pathlib.Path(__file__).resolve().parent.parent / "browser_automation.js"
     try:
-        cmd = [
-            "node", str(script_path),
-            "--query", query,
-            "--format", fmt,
-            "--headless"
-        ]
-        start_time = datetime.utcnow()
+        cmd = ["node", _BROWSER_SCRIPT, "--query", query, "--format", fmt, "--headless"]
+        start_time = time.perf_counter()
         result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=300)
-        # The script prints JSON on the last line
-        out_data = json.loads(result.stdout.splitlines()[-1])
+        # The script prints JSON on the last line; decode only that line
+        last_line = result.stdout.rstrip().rpartition("\n")[2]
+        out_data = fastjson.loads(last_line)
         if output and out_data.get("status") == "ok":
             shutil.move(out_data["output"], output)
         if analytics:
-            analytics.log_success(method, (datetime.utcnow() - start_time).total_seconds())
+            analytics.log_success(method, time.perf_counter() - start_time)
         return True
     except subprocess.TimeoutExpired:
         print("[ERROR] Browser fallback timed out.")
@@ -110,7 +118,7 @@ def run_browser_fallback(query: str, fmt: str, output: Optional[str] = None,
         print(f"[ERROR] Browser fallback failed with code {e.returncode}: {e.stderr}")
         if analytics:
             analytics.log_failure(method, f"subprocess_error: {e.stderr}")
-    except json.JSONDecodeError:
+    except fastjson.JSONDecodeError:
         print("[ERROR] Invalid JSON from browser fallback.")
         if analytics:
             analytics.log_failure(method, "json_error")
@@ -120,6 +128,88 @@ def run_browser_fallback(query: str, fmt: str, output: Optional[str] = None,
             analytics.log_failure(method, str(e))
     return False
 
+def prefetch_pages(client: CensysClient, index: str, query: str, per_page: int,
+                   cursor: Optional[str], max_pages: float
+                   ) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str], float]]:
+    """
+    Yield ``(hits, next_cursor, elapsed)`` per page while the next page is fetched in the background.
+
+    A daemon thread follows the cursor chain and stops after ``max_pages``
+    pages, an empty page, or a missing/repeated cursor. Errors raised by
+    ``client.search`` are re-raised from the generator in page order.
+    """
+    pages: queue.Queue = queue.Queue(maxsize=PREFETCH_PAGES)
+
+    def _produce() -> None:
+        cur = cursor
+        fetched = 0
+        try:
+            while fetched < max_pages:
+                start_time = time.perf_counter()
+                hits, next_cursor = client.search(index, query, per_page=per_page, cursor=cur)
+                fetched += 1
+                pages.put((hits, next_cursor, time.perf_counter() - start_time))
+                if not hits or not next_cursor or next_cursor == cur:
+                    break
+                cur = next_cursor
+        except Exception as e:
+            pages.put(e)
+            return
+        pages.put(_PREFETCH_DONE)
+
+    threading.Thread(target=_produce, name="censys-prefetch", daemon=True).start()
+    while True:
+        item = pages.get()
+        if item is _PREFETCH_DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+def csv_row_builder(header: List[str], stringify: bool) -> Callable[[Dict[str, Any]], List[str]]:
+    """
+    Return a function mapping a record to its CSV cells in ``header`` order.
+
+    Cells are always strings and missing columns become empty strings. With
+    ``stringify`` (the ``--fields`` path) non-string values go through
+    ``FlattenHelper.stringify``; flattened records only hold scalars, so
+    ``str`` suffices.
+    """
+    cols = tuple(header)
+    if not stringify:
+        blanks = itertools.repeat("")
+        def build(row: Dict[str, Any]) -> List[str]:
+            return list(map(str, map(row.get, cols, blanks)))
+        return build
+    to_str = FlattenHelper.stringify
+    def build_stringified(row: Dict[str, Any]) -> List[str]:
+        return [v if v.__class__ is str else to_str(v) for v in map(row.get, cols)]
+    return build_stringified
+
+def write_csv_rows(out_file, csv_writer, rows: Iterable[List[str]], ncols: int) -> None:
+    """
+    Write string rows, bypassing the csv module when no cell needs quoting.
+
+    A joined line with exactly ``ncols - 1`` commas and no quote or line-break
+    characters is byte-identical to what ``csv.writer`` would emit, so it is
+    written directly; any other row is handed to ``csv_writer``.
+    """
+    terminator = csv_writer.dialect.lineterminator
+    commas = ncols - 1
+    lines: List[str] = []
+    for cells in rows:
+        line = ",".join(cells)
+        if (line.count(",") == commas and '"' not in line and "\n" not in line
+                and "\r" not in line and (line or ncols > 1)):
+            lines.append(line)
+            continue
+        if lines:
+            out_file.write(terminator.join(lines) + terminator)
+            lines = []
+        csv_writer.writerow(cells)
+    if lines:
+        out_file.write(terminator.join(lines) + terminator)
+
 def main() -> None:
     """Main CLI logic for querying Censys and handling output."""
     args = parse_args()
@@ -128,12 +218,14 @@ def main() -> None:
     ensure_parent(pathlib.Path(log_path))
     logger = get_logger("censys_cli", log_path, args.verbose)
     analytics = Analytics() if args.analytics else None
-    ml_predictor = MLPredictor() if args.ml_predict else None
+    ml_predictor = MLPredictor(use_rf=args.ml_rf) if args.ml_predict else None
     if ml_predictor:
-        ml_predictor.train()
+        # Train while the first API page is in flight; recommend() waits if needed
+        ml_predictor.train_async()
 
     job_id = make_job_id(args.index, args.query, args.fields)
-    logger.info("job_start", extra={"job_id": job_id, "args": vars(args)})
+    # "args" is a reserved LogRecord attribute, hence "cli_args"
+    logger.info("job_start", extra={"job_id": job_id, "cli_args": vars(args)})
 
     if args.dry_run:
         print(json.dumps({"status": "dry_run", "job_id": job_id}, indent=2))
@@ -184,26 +276,50 @@ def main() -> None:
     max_pages = args.pages or float("inf")
     fields = args.fields
     header = None
+    build_row = None
+    # One state connection for the whole run
+    state_conn = open_db(args.state_db) if not args.no_state else None
+
+    # Latest cursor is saved every few pages, and at exit if the run stops early
+    checkpoint = None
+    if state_conn is not None:
+        checkpoint = StateCheckpoint(state_conn, job_id, args.index, args.query, fields)
+        atexit.register(checkpoint.save)
 
     # Resume state if possible
-    if not args.no_state and not cursor:
-        state = get_state(args.state_db, job_id)
+    if state_conn is not None and not cursor:
+        state = get_state(state_conn, job_id)
+        if state is None:
+            # Jobs saved before the BLAKE2b switch are keyed by their SHA-1 ID
+            state = get_state(state_conn, make_legacy_job_id(args.index, args.query, args.fields))
         if state:
             cursor = state["cursor"]
             total = state["total"]
             logger.info("resuming_from_state", extra={"cursor": cursor, "total": total})
 
-    with open(out_path, "a", encoding="utf-8") as out_file:
+    if args.format == "json":
+        out_file = open(out_path, "ab", buffering=OUTPUT_BUFFER_SIZE)
+    else:
+        out_file = open(out_path, "a", encoding="utf-8")
+    with out_file:
         csv_writer = csv.writer(out_file) if args.format == "csv" else None
+        # Bind hot-loop callables to locals once
+        dumps = fastjson.dumps
+        select = FlattenHelper.compile_fields(fields) if fields else None
+        write_lines = out_file.writelines
+        log_info = logger.info
+        # The level is fixed for the run; skip building per-page extras when INFO is off
+        page_logging = logger.isEnabledFor(logging.INFO)
+        # Fetch page N+1 while page N is being written; state is recorded after each write
+        pages = prefetch_pages(client, args.index, args.query, args.page_size, cursor, max_pages)
         while page <= max_pages:
             try:
-                start_time = datetime.utcnow()
-                hits, next_cursor = client.search(
-                    args.index, args.query, per_page=args.page_size, cursor=cursor
-                )
+                hits, next_cursor, elapsed = next(pages)
                 page += 1
                 if analytics:
-                    analytics.log_success("api", (datetime.utcnow() - start_time).total_seconds())
+                    analytics.log_success("api", elapsed)
+            except StopIteration:
+                break
             except Exception as e:
                 logger.warning("api_error_fallback_to_browser", extra={"error": str(e)})
                 if analytics:
@@ -225,24 +341,23 @@ def main() -> None:
 
             try:
                 if args.format == "json":
-                    for h in hits:
-                        rec = FlattenHelper.select_fields(h, fields) if fields else h
-                        out_file.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    if fields:
+                        write_lines([dumps(select(h)) + b"\n" for h in hits])
+                    else:
+                        write_lines([dumps(h) + b"\n" for h in hits])
                     total += len(hits)
                 else:
                     flattened_batch = []
                     for h in hits:
-                        rec = FlattenHelper.select_fields(h, fields) if fields else FlattenHelper.flatten(h)
+                        rec = select(h) if fields else FlattenHelper.flatten(h)
                         flattened_batch.append(rec)
                     if flattened_batch:
                         if header is None:
-                            header = fields if fields else sorted(set().union(*[set(d.keys()) for d in flattened_batch]))
+                            # First-seen key order, deduplicated in a single pass
+                            header = fields if fields else list(dict.fromkeys(k for d in flattened_batch for k in d))
                             csv_writer.writerow(header)
-                        for row in flattened_batch:
-                            csv_writer.writerow([
-                                FlattenHelper.stringify(row.get(col, "")) if fields else row.get(col, "")
-                                for col in header
-                            ])
+                            build_row = csv_row_builder(header, stringify=bool(fields))
+                        write_csv_rows(out_file, csv_writer, map(build_row, flattened_batch), len(header))
                         total += len(flattened_batch)
             except Exception as e:
                 logger.error("output_write_failed", extra={"error": str(e)})
@@ -250,20 +365,25 @@ def main() -> None:
                     analytics.log_failure("output", str(e))
                 sys.exit(1)
 
-            logger.info("page_done", extra={"page": page, "page_count": len(hits), "total": total})
+            if page_logging:
+                log_info("page_done", extra={"page": page, "page_count": len(hits), "total": total})
 
-            if not args.no_state:
-                upsert_state(args.state_db, job_id, args.index, args.query, fields, next_cursor, total)
+            if checkpoint is not None:
+                checkpoint.update(next_cursor, total)
 
             if not next_cursor or next_cursor == cursor:
                 break
             cursor = next_cursor
 
+    client.close()
     logger.info("completed", extra={"total": total, "output": str(out_path)})
-    if not args.no_state:
-        upsert_state(args.state_db, job_id, args.index, args.query, fields, cursor, total)
+    if state_conn is not None:
+        atexit.unregister(checkpoint.save)
+        upsert_state(state_conn, job_id, args.index, args.query, fields, cursor, total)
+        state_conn.close()
     if analytics:
         analytics.print_stats()
+        analytics.close()
     print(json.dumps({"status": "ok", "total": total, "output": str(out_path), "log": str(log_path)}, indent=2))
 
 if __name__ == "__main__":
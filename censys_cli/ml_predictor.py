@@ -2,99 +2,238 @@
 """
 Machine‑learning predictor for CAPTCHA bypass method selection.
 
-This module uses a Random Forest classifier to recommend whether the Censys
-CLI should attempt a Proof‑of‑Work (``pow``) or 2Captcha (``2captcha``)
-bypass based on historical CAPTCHA metrics stored in SQLite.  It gracefully
-handles missing dependencies (pandas or scikit‑learn) by falling back to a
-deterministic choice.
+This module recommends whether the Censys CLI should attempt a
+Proof‑of‑Work (``pow``) or 2Captcha (``2captcha``) bypass based on
+historical CAPTCHA metrics stored in SQLite.  By default it compares
+smoothed success rates with a single SQL query; with ``use_rf=True`` it
+trains a Random Forest classifier instead.  Features are
+built directly with NumPy from SQLite rows, and the fitted model is cached
+next to the database so it is only retrained when new metrics arrive.
+NumPy and scikit‑learn are imported on first use, not with the module.  It
+gracefully handles missing dependencies (NumPy or scikit‑learn) by falling
+back to a deterministic choice.
 """
 from __future__ import annotations
 
+import os
 import sqlite3
-from typing import Optional, Tuple
-
-try:
-    import pandas as pd  # type: ignore
-except ImportError:
-    pd = None  # type: ignore
-try:
-    from sklearn.ensemble import RandomForestClassifier  # type: ignore
-    from sklearn.model_selection import train_test_split  # type: ignore
-    from sklearn.metrics import accuracy_score  # type: ignore
-except ImportError:
-    RandomForestClassifier = None  # type: ignore
-    train_test_split = None  # type: ignore
-    accuracy_score = None  # type: ignore
+import stat
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+# Heavy optional dependencies, imported on first use by _lazy_imports()
+np = None  # type: ignore
+RandomForestClassifier = None  # type: ignore
+train_test_split = None  # type: ignore
+accuracy_score = None  # type: ignore
+joblib = None  # type: ignore
+_imports_attempted = False
+
+def _lazy_imports() -> bool:
+    """Import NumPy, scikit‑learn and joblib the first time they are needed.
+
+    Keeps ``import censys_cli.ml_predictor`` cheap for runs that never train.
+    Returns True when NumPy and scikit‑learn are available; joblib only
+    enables the model cache and may be missing.
+    """
+    global np, RandomForestClassifier, train_test_split, accuracy_score, joblib, _imports_attempted
+    if not _imports_attempted:
+        _imports_attempted = True
+        try:
+            import numpy as _np  # type: ignore
+            np = _np
+        except ImportError:
+            pass
+        try:
+            from sklearn.ensemble import RandomForestClassifier as _rf  # type: ignore
+            from sklearn.model_selection import train_test_split as _split  # type: ignore
+            from sklearn.metrics import accuracy_score as _accuracy  # type: ignore
+            RandomForestClassifier, train_test_split, accuracy_score = _rf, _split, _accuracy
+        except ImportError:
+            pass
+        try:
+            import joblib as _joblib  # type: ignore
+            joblib = _joblib
+        except ImportError:
+            pass
+    return np is not None and RandomForestClassifier is not None
+
+# Entries every model cache written by MLPredictor._save_cache holds
+_CACHE_KEYS = frozenset(('model', 'cols', 'mean_time', 'data_sig'))
+
+def _open_nofollow(path: str, flags: int) -> int:
+    """``open`` opener that refuses to follow a symlink at ``path``."""
+    return os.open(path, flags | getattr(os, 'O_NOFOLLOW', 0))
+
+def _is_trusted(st: os.stat_result) -> bool:
+    """Return True if a cache file with status ``st`` is safe to unpickle."""
+    if not stat.S_ISREG(st.st_mode) or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    getuid = getattr(os, 'getuid', None)
+    return getuid is None or st.st_uid == getuid()
+
+# Methods scored by recommend(); the first wins ties
+CANDIDATE_METHODS = ('pow', '2captcha')
 
 class MLPredictor:
     """Predict the optimal CAPTCHA bypass method using a simple ML model."""
 
-    def __init__(self, db_path: str = "./analytics.sqlite") -> None:
+    def __init__(self, db_path: str = "./analytics.sqlite", use_rf: bool = False) -> None:
         self.db_path = db_path
+        # The Random Forest is opt-in; by default recommend() uses recommend_fast()
+        self.use_rf = use_rf
+        self.cache_path = db_path + ".mlcache.pkl"
         self.model: Optional[RandomForestClassifier] = None
         self.trained: bool = False
+        self._train_future: Optional[Future] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        # Cached at the end of train() so recommend() never re-reads the table
+        self._mean_time: Optional[float] = None
+        self._feature_cols: Optional[List[str]] = None
+        self._candidates = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the predictor's SQLite connection, opening it on first use."""
+        if self._conn is None:
+            # Training may run on a worker thread (train_async)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
 
-    def load_data(self):
+    def load_data(self) -> List[tuple]:
         """Load historical CAPTCHA metrics from the SQLite database.
 
-        Returns a pandas DataFrame with columns ``method``, ``success``,
-        ``response_time`` and ``error_message``.  Returns an empty
-        DataFrame if pandas is unavailable or the table does not exist.
+        Returns a list of ``(method, success, response_time, error_message)``
+        rows, or an empty list if the table does not exist yet.
         """
-        if pd is None:
+        try:
+            return self._connection().execute(
+                "SELECT method, success, response_time, error_message FROM captcha_metrics"
+            ).fetchall()
+        except sqlite3.Error:
+            # Table may not exist yet
+            return []
+
+    def _data_signature(self) -> Optional[Tuple[int, Optional[int]]]:
+        """Return ``(row_count, max_id)`` of the metrics table, or None if it is missing.
+
+        Metrics are append-only, so an unchanged signature means unchanged data.
+        """
+        try:
+            return tuple(self._connection().execute(
+                "SELECT COUNT(*), MAX(id) FROM captcha_metrics"
+            ).fetchone())
+        except sqlite3.Error:
             return None
-        conn = sqlite3.connect(self.db_path)
+
+    def load_cached(self) -> bool:
+        """Restore a model saved by :meth:`train` if the metrics have not changed since.
+
+        The cache is a pickle, and unpickling it can run arbitrary code, so
+        it is only trusted when it is a regular file (not a symlink) owned
+        by the current user and not writable by group or others.  Anyone
+        who can write that file can still run code as this user.
+
+        Returns True when the cached model was loaded.
+        """
+        if not _lazy_imports() or joblib is None:
+            return False
         try:
-            df = pd.read_sql_query(
-                "SELECT method, success, response_time, error_message FROM captcha_metrics",
-                conn
-            )
-            return df
+            # Check the opened file itself so it cannot be swapped after the check
+            with open(self.cache_path, 'rb', opener=_open_nofollow) as fh:
+                if not _is_trusted(os.fstat(fh.fileno())):
+                    return False
+                cached = joblib.load(fh)
+            if not isinstance(cached, dict) or not _CACHE_KEYS <= cached.keys():
+                return False
         except Exception:
-            # Table may not exist yet
-            return pd.DataFrame()
-        finally:
-            conn.close()
+            # Missing, unreadable or written by an incompatible version
+            return False
+        signature = self._data_signature()
+        if signature is None or cached.get('data_sig') != signature:
+            return False
+        self.model = cached['model']
+        self._feature_cols = cached['cols']
+        self._mean_time = cached['mean_time']
+        self._candidates = self._build_candidates()
+        self.trained = True
+        return True
 
-    def preprocess(self, df) -> Tuple[object, object]:
+    def _save_cache(self, signature: Tuple[int, Optional[int]]) -> None:
+        """Persist the fitted model and the values recommend() needs."""
+        if joblib is None:
+            return
+        try:
+            joblib.dump({
+                'model': self.model,
+                'cols': self._feature_cols,
+                'mean_time': self._mean_time,
+                'data_sig': signature,
+            }, self.cache_path, compress=3)
+            # load_cached rejects caches other users could have written
+            os.chmod(self.cache_path, 0o600)
+        except OSError:
+            pass  # Caching is best effort
+
+    def preprocess(self, rows: List[tuple]) -> Tuple[object, object, List[str]]:
         """Preprocess the historical data for training.
 
         * Encodes the error type from ``error_message`` (the prefix before a colon)
           and fills missing ``response_time`` with the mean.
         * One‑hot encodes the ``method`` and ``error_type`` categorical features.
 
-        Returns ``(X, y)`` where ``X`` is a DataFrame of features and ``y``
-        is a Series of target labels.
+        Returns ``(X, y, feature_names)`` where ``X`` is a float matrix with
+        columns ``method_*``, ``error_type_*`` (each sorted) and
+        ``response_time``, and ``y`` is the array of success labels.
         """
+        n = len(rows)
+        methods = np.array([r[0] for r in rows], dtype=object)
+        target = np.fromiter((r[1] for r in rows), dtype=np.int8, count=n)
+        response_time = np.fromiter(
+            (np.nan if r[2] is None else r[2] for r in rows), dtype=np.float64, count=n
+        )
         # Extract error_type from error_message
-        df = df.copy()
-        df['error_type'] = df['error_message'].apply(
-            lambda x: 'none' if x is None or (pd.isna(x) if pd is not None else True) else str(x).split(':')[0]
+        error_types = np.array(
+            ['none' if r[3] is None else str(r[3]).split(':', 1)[0] for r in rows], dtype=object
         )
         # Impute missing response_time values with the mean
-        mean_time = df['response_time'].mean() if not df['response_time'].empty else 0
-        df['response_time'] = df['response_time'].fillna(mean_time)
+        missing = np.isnan(response_time)
+        mean_time = float(response_time[~missing].mean()) if not missing.all() else 0.0
+        response_time[missing] = mean_time
         # One‑hot encode categorical columns
-        features = pd.get_dummies(df[['method', 'error_type']], columns=['method', 'error_type'])
-        features['response_time'] = df['response_time']
-        target = df['success']
-        return features, target
+        method_names, method_codes = np.unique(methods, return_inverse=True)
+        error_names, error_codes = np.unique(error_types, return_inverse=True)
+        features = np.hstack([
+            np.eye(len(method_names))[method_codes],
+            np.eye(len(error_names))[error_codes],
+            response_time[:, None],
+        ])
+        feature_names = (
+            [f"method_{m}" for m in method_names]
+            + [f"error_type_{e}" for e in error_names]
+            + ["response_time"]
+        )
+        return features, target, feature_names
 
     def train(self) -> bool:
         """Train the Random Forest model using available data.
 
-        Returns True if training succeeds, otherwise False (e.g. if there
-        is insufficient data or dependencies are missing).
+        Reuses the on-disk model from a previous run when the metrics table
+        is unchanged.  Returns True if training succeeds, otherwise False
+        (e.g. if ``use_rf`` is off, there is insufficient data or
+        dependencies are missing).
         """
-        # Ensure dependencies are present
-        if pd is None or RandomForestClassifier is None or train_test_split is None:
+        # Ensure the model is wanted and dependencies are present
+        if not self.use_rf or not _lazy_imports():
             return False
-        df = self.load_data()
-        if df is None or df.empty:
+        if self.load_cached():
+            return True
+        signature = self._data_signature()
+        rows = self.load_data()
+        if not rows:
             return False
-        X, y = self.preprocess(df)
+        X, y, feature_names = self.preprocess(rows)
         # If there are no positive or no negative samples, training is not meaningful
-        if y.nunique() < 2:
+        if len(np.unique(y)) < 2:
             return False
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         self.model = RandomForestClassifier(n_estimators=50, random_state=42)
@@ -103,36 +242,85 @@ class MLPredictor:
         if accuracy_score is not None:
             accuracy = accuracy_score(y_test, self.model.predict(X_test))
             print(f"[INFO] ML model accuracy: {accuracy:.3f}")
+        self._mean_time = float(X[:, -1].mean())
+        self._feature_cols = feature_names
+        self._candidates = self._build_candidates()
         self.trained = True
+        if signature is not None and signature[0] == len(rows):
+            self._save_cache(signature)
         return True
 
+    def _build_candidates(self):
+        """Build the feature matrix scored by :meth:`recommend`, one row per candidate method.
+
+        Each row one‑hot encodes its method, assumes no error type and uses
+        the mean response time; columns unseen during training stay zero.
+        """
+        col = {name: i for i, name in enumerate(self._feature_cols)}
+        X = np.zeros((len(CANDIDATE_METHODS), len(self._feature_cols)), dtype=np.float32)
+        X[:, col['response_time']] = self._mean_time
+        if 'error_type_none' in col:
+            X[:, col['error_type_none']] = 1
+        for row, method in enumerate(CANDIDATE_METHODS):
+            if f'method_{method}' in col:
+                X[row, col[f'method_{method}']] = 1
+        return X
+
+    def train_async(self) -> Future:
+        """Start :meth:`train` on a background thread.
+
+        Returns the future; :meth:`recommend` waits for it, so callers that
+        never need a recommendation never block on training.
+        """
+        if not self.use_rf:
+            # Nothing to train; keep recommend() from waiting on a thread
+            self._train_future = Future()
+            self._train_future.set_result(False)
+            return self._train_future
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-train")
+        self._train_future = executor.submit(self.train)
+        executor.shutdown(wait=False)
+        return self._train_future
+
+    def recommend_fast(self) -> str:
+        """Recommend the method with the best smoothed success rate.
+
+        One SQL aggregate per candidate method; each rate is Beta(1,1)
+        smoothed as ``(successes + 1) / (attempts + 2)``, so a method with no
+        history scores 0.5.  Ties go to the earlier entry of
+        ``CANDIDATE_METHODS`` (``pow``).
+        """
+        rates = dict.fromkeys(CANDIDATE_METHODS, 0.5)
+        try:
+            rows = self._connection().execute(
+                "SELECT method, SUM(success), COUNT(*) FROM captcha_metrics "
+                "WHERE method IN (%s) GROUP BY method" % ",".join("?" * len(CANDIDATE_METHODS)),
+                CANDIDATE_METHODS,
+            ).fetchall()
+        except sqlite3.Error:
+            # Table may not exist yet
+            rows = []
+        for method, successes, attempts in rows:
+            rates[method] = (successes + 1) / (attempts + 2)
+        return max(CANDIDATE_METHODS, key=rates.__getitem__)
+
     def recommend(self) -> str:
         """Recommend the optimal CAPTCHA bypass method.
 
-        If the model has not been trained or dependencies are unavailable,
-        defaults to ``pow``.  Otherwise, it constructs synthetic feature
-        vectors for ``pow`` and ``2captcha`` using average metrics from
-        historical data and returns the method with the higher predicted
-        probability of success.
+        Without ``use_rf`` this is :meth:`recommend_fast`.  With it, if the
+        model has not been trained or dependencies are unavailable, defaults
+        to ``pow``.  Otherwise, it constructs synthetic feature vectors for
+        ``pow`` and ``2captcha`` using average metrics from historical data
+        (cached by :meth:`train`) and returns the method with the higher
+        predicted probability of success.  Waits for a pending
+        :meth:`train_async`.
         """
+        if not self.use_rf:
+            return self.recommend_fast()
+        if self._train_future is not None:
+            self._train_future.result()
         # Default recommendation if model cannot be trained
-        if not self.trained or self.model is None or pd is None:
-            return 'pow'
-        df = self.load_data()
-        if df is None or df.empty:
+        if not self.trained or self.model is None or self._candidates is None:
             return 'pow'
-        # Build feature vectors for each method with average response_time
-        mean_time = df['response_time'].fillna(df['response_time'].mean()).mean()
-        methods = ['pow', '2captcha']
-        candidates = []
-        for m in methods:
-            row = {'response_time': mean_time}
-            # One‑hot encode method
-            for method_name in methods:
-                row[f'method_{method_name}'] = 1 if method_name == m else 0
-            # Assume no error type
-            row['error_type_none'] = 1
-            candidates.append(row)
-        X_candidate = pd.DataFrame(candidates).reindex(columns=self.model.feature_names_in_, fill_value=0)
-        probs = self.model.predict_proba(X_candidate)[:, 1]  # Probability of success
-        return methods[int(probs.argmax())]
\ No newline at end of file
+        probs = self.model.predict_proba(self._candidates)[:, 1]  # Probability of success
+        return CANDIDATE_METHODS[int(probs.argmax())]
@@ -0,0 +1,60 @@
+"""
+JSON encoding and decoding helpers for the Censys CLI.
+Uses orjson when installed and falls back to the standard library otherwise.
+Both paths produce compact UTF-8 output so results do not depend on which is available.
+"""
+import json
+import re
+from typing import Any, Union
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None  # type: ignore
+
+# orjson.JSONDecodeError subclasses this, so one except clause covers both backends
+JSONDecodeError = json.JSONDecodeError
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+_encode_sorted = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode
+
+# orjson only handles 64-bit integers: it rejects wider ones when encoding
+# and silently turns them into floats when decoding.  Any run of 19+ digits
+# might be such an integer, so those inputs take the stdlib path instead.
+_WIDE_INT_BYTES = re.compile(rb"(?<![\d.])\d{19,}")
+_WIDE_INT_STR = re.compile(r"(?<![\d.])\d{19,}")
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """Serialise ``obj`` to compact UTF-8 encoded JSON bytes."""
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            # Integers wider than 64 bits; the stdlib encoder writes them exactly
+            return _encode(obj).encode("utf-8")
+
+    def dumps_sorted(obj: Any) -> bytes:
+        """Serialise ``obj`` like ``dumps`` with dictionary keys sorted."""
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            return _encode_sorted(obj).encode("utf-8")
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Parse JSON from ``bytes`` or ``str``, keeping integers of any width exact."""
+        wide_int = _WIDE_INT_STR if isinstance(data, str) else _WIDE_INT_BYTES
+        if wide_int.search(data):
+            return json.loads(data)
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        """Serialise ``obj`` to compact UTF-8 encoded JSON bytes."""
+        return _encode(obj).encode("utf-8")
+
+    def dumps_sorted(obj: Any) -> bytes:
+        """Serialise ``obj`` like ``dumps`` with dictionary keys sorted."""
+        return _encode_sorted(obj).encode("utf-8")
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Parse JSON from ``bytes`` or ``str``."""
+        return json.loads(data)
@@ -2,62 +2,149 @@
 Utilities for flattening nested dictionaries and selecting specific fields.
 Used for CSV output and field filtering in the Censys CLI.
 """
-from typing import Any, Dict, List
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Path tokens: key names, or list indices written as [i]
+_PATH_RE = re.compile(r"[^\.\[\]]+|\[\d+\]")
+
+# Exact leaf types for the all-scalar list fast path in iter_flatten
+_SCALAR_TYPES = frozenset((int, float, str, bool))
+# Shorter lists take the generic path; the type scan only pays off on long ones
+_SCALAR_RUN_MIN = 16
+
+# A parsed path step: a dict key, or an int list index
+PathToken = Union[str, int]
+
+# Containers are rendered as compact JSON by the C encoder; unknown leaves fall back to str()
+_encode_container = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
 
 def _stringify(value: Any) -> str:
-    """Convert a value to a string representation."""
-    if isinstance(value, (list, tuple)):
-        return ",".join([_stringify(v) for v in value])
-    if isinstance(value, dict):
-        items = []
-        for k, v in value.items():
-            items.append(f"{k}:{_stringify(v)}")
-        return "{" + ",".join(items) + "}"
+    """Convert a value to a string representation.
+
+    Lists, tuples and dicts become compact JSON, ``None`` becomes ``""`` and
+    anything else goes through ``str``.
+    """
     if value is None:
         return ""
+    if isinstance(value, (list, tuple, dict)):
+        return _encode_container(value)
     return str(value)
 
+@lru_cache(maxsize=256)
+def _tokenize_path(path: str) -> Tuple[PathToken, ...]:
+    """Split a field path such as ``services[0].port`` into keys and integer list indices."""
+    return tuple(int(t[1:-1]) if t[0] == "[" else t for t in _PATH_RE.findall(path))
+
+def _get_path(obj: Any, tokens: Sequence[PathToken]) -> Any:
+    """Follow pre-tokenized path ``tokens`` through ``obj``; None if any step is missing."""
+    cur = obj
+    for t in tokens:
+        if t.__class__ is int:
+            if isinstance(cur, list) and 0 <= t < len(cur):
+                cur = cur[t]
+            else:
+                return None
+        else:
+            if isinstance(cur, dict) and t in cur:
+                cur = cur[t]
+            else:
+                return None
+    return cur
+
 class FlattenHelper:
     @staticmethod
-    def flatten(d: Dict[str, Any], sep: str = ".") -> Dict[str, Any]:
-        """Flatten a nested dictionary into a single-level dictionary with dot notation."""
-        out: Dict[str, Any] = {}
-        def _rec(prefix: str, obj: Any):
-            if isinstance(obj, dict):
-                for k, v in obj.items():
-                    _rec(f"{prefix}{sep}{k}" if prefix else k, v)
-            elif isinstance(obj, list):
-                if not obj:
-                    out[prefix] = ""
+    def iter_flatten(d: Dict[str, Any], sep: str = ".") -> Iterator[Tuple[str, Any]]:
+        """Yield the ``(key, value)`` pairs of ``flatten(d, sep)`` without building a dict.
+
+        Walks the record with an explicit stack of child iterators, so deep
+        records cannot hit the recursion limit. Scalars are yielded as they
+        are met and only containers push a frame, which keeps keys in
+        depth-first order.
+        """
+        _dict, _list, _scalar = dict, list, (int, float, str)
+        # Frames: (key prefix, iterator over children, children are list items)
+        stack = [("", iter(d.items()), False)]
+        push, pop = stack.append, stack.pop
+        while stack:
+            prefix, children, indexed = stack[-1]
+            for k, v in children:
+                if indexed:
+                    key = f"{prefix}[{k}]"
+                else:
+                    key = f"{prefix}{sep}{k}" if prefix else k
+                if isinstance(v, _scalar):
+                    yield key, v
+                elif isinstance(v, _dict):
+                    push((key, iter(v.items()), False))
+                    break
+                elif isinstance(v, _list):
+                    if not v:
+                        yield key, ""
+                    elif len(v) >= _SCALAR_RUN_MIN and set(map(type, v)) <= _SCALAR_TYPES:
+                        # All-scalar list (ports, ASN paths): emit leaves without a frame
+                        yield from zip([f"{key}[{i}]" for i in range(len(v))], v)
+                    else:
+                        push((key, enumerate(v), True))
+                        break
                 else:
-                    for i, v in enumerate(obj):
-                        _rec(f"{prefix}[{i}]", v)
+                    yield key, _stringify(v)
             else:
-                out[prefix] = obj if isinstance(obj, (int, float, str)) else _stringify(obj)
-        _rec("", d)
-        return out
+                pop()
+
+    @staticmethod
+    def flatten(d: Dict[str, Any], sep: str = ".") -> Dict[str, Any]:
+        """Flatten a nested dictionary into a single-level dictionary with dot notation."""
+        # Already-flat records skip the iterator stack
+        coerce = False
+        for v in d.values():
+            if isinstance(v, (int, float, str)):
+                continue
+            if isinstance(v, (dict, list)):
+                break
+            coerce = True
+        else:
+            if not coerce:
+                return dict(d)
+            return {k: v if isinstance(v, (int, float, str)) else _stringify(v) for k, v in d.items()}
+        # dict() cannot presize from pairs (even a list of them), so feed the generator directly
+        return dict(FlattenHelper.iter_flatten(d, sep))
 
     @staticmethod
     def select_fields(d: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
         """Extract specified fields from a dictionary using dot notation and list indices."""
-        def get_path(obj: Any, path: str):
-            cur = obj
-            import re
-            tokens = re.findall(r"[^\.\[\]]+|\[\d+\]", path)
-            for t in tokens:
-                if t.startswith("[") and t.endswith("]"):
-                    idx = int(t[1:-1])
-                    if isinstance(cur, list) and 0 <= idx < len(cur):
-                        cur = cur[idx]
-                    else:
-                        return None
-                else:
-                    if isinstance(cur, dict) and t in cur:
-                        cur = cur[t]
-                    else:
-                        return None
-            return cur
-        return {f: get_path(d, f) for f in fields}
+        return {f: _get_path(d, _tokenize_path(f)) for f in fields}
+
+    @staticmethod
+    def tokenize_fields(fields: List[str]) -> List[Tuple[str, Tuple[PathToken, ...]]]:
+        """Parse each field path once, for use with ``select_fields_precompiled``."""
+        return [(f, _tokenize_path(f)) for f in fields]
+
+    @staticmethod
+    def select_fields_precompiled(d: Dict[str, Any], tokenized: List[Tuple[str, Tuple[PathToken, ...]]]) -> Dict[str, Any]:
+        """Same as ``select_fields`` but takes paths already parsed by ``tokenize_fields``."""
+        return {f: _get_path(d, tokens) for f, tokens in tokenized}
+
+    @staticmethod
+    def compile_fields(fields: List[str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """Return a ``select_fields`` equivalent with every path parsed up front.
+
+        Use it when the same ``fields`` are applied to many records. Plain
+        top-level names are read with ``dict.get`` and skip path walking.
+        """
+        tokenized = FlattenHelper.tokenize_fields(fields)
+        if all(tokens == (f,) for f, tokens in tokenized):
+            names = tuple(fields)
+            def select_top_level(d: Dict[str, Any]) -> Dict[str, Any]:
+                get = d.get
+                return {f: get(f) for f in names}
+            return select_top_level
+        select_precompiled = FlattenHelper.select_fields_precompiled
+        def select(d: Dict[str, Any]) -> Dict[str, Any]:
+            return select_precompiled(d, tokenized)
+        return select
 
     @staticmethod
     def stringify(x: Any) -> str:
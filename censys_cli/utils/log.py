@@ -2,10 +2,22 @@
 Structured logging utilities for the Censys CLI.
 Outputs JSON logs to file and human-readable logs to stderr.
 """
-import json
 import logging
 import sys
 
+from . import fastjson
+
+# Write buffer size of the JSON log file
+LOG_BUFFER_SIZE = 1 << 16
+
+# Standard LogRecord attributes that are never copied into the JSON payload
+_RESERVED = frozenset((
+    "msg", "args", "name", "levelname", "levelno", "pathname",
+    "filename", "module", "exc_info", "exc_text", "stack_info",
+    "lineno", "funcName", "created", "msecs", "relativeCreated",
+    "thread", "threadName", "processName", "process",
+))
+
 class JsonFormatter(logging.Formatter):
     """Format log records as JSON for structured logging."""
     def format(self, record):
@@ -13,22 +25,46 @@ class JsonFormatter(logging.Formatter):
             "level": record.levelname.lower(),
             "msg": record.getMessage(),
         }
-        if hasattr(record, "asctime"):
+        attrs = getattr(record, "__dict__", {})
+        if "asctime" in attrs:
             data["time"] = record.asctime
-        for k, v in getattr(record, "__dict__", {}).items():
-            if k in ("msg", "args", "name", "levelname", "levelno", "pathname",
-                     "filename", "module", "exc_info", "exc_text", "stack_info",
-                     "lineno", "funcName", "created", "msecs", "relativeCreated",
-                     "thread", "threadName", "processName", "process"):
-                continue
-            if k not in data and not k.startswith("_"):
+        for k, v in attrs.items():
+            if k not in _RESERVED and k not in data and not k.startswith("_"):
                 data[k] = v
-        return json.dumps(data, ensure_ascii=False)
+        return fastjson.dumps(data).decode("utf-8")
+
+class BufferedFileHandler(logging.FileHandler):
+    """File handler that flushes only for ERROR and above, and on close.
+
+    ``logging.FileHandler`` flushes after every record; here lower-level
+    records stay in a ``LOG_BUFFER_SIZE`` write buffer until it fills.
+    """
+    def __init__(self, filename, encoding="utf-8", delay=True, flush_level=logging.ERROR):
+        self.flush_level = flush_level
+        super().__init__(filename, encoding=encoding, delay=delay)
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= self.flush_level:
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 def get_logger(name: str, logfile: str, verbose: bool = False):
     """Configure a logger with file and stderr handlers."""
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+    for handler in logger.handlers:
+        handler.close()
     logger.handlers = []
 
     sh = logging.StreamHandler(sys.stderr)
@@ -36,7 +72,8 @@ def get_logger(name: str, logfile: str, verbose: bool = False):
     sh.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
     logger.addHandler(sh)
 
-    fh = logging.FileHandler(logfile, encoding="utf-8")
+    # Opened on first write; logging.shutdown() flushes and closes it at exit
+    fh = BufferedFileHandler(logfile)
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(JsonFormatter())
     logger.addHandler(fh)
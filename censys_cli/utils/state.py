@@ -2,12 +2,15 @@
 State management for Censys CLI using SQLite.
 Stores job state for resuming interrupted queries.
 """
+import atexit
 import sqlite3
 import os
 import json
 import hashlib
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
+
+from . import fastjson
 
 DEFAULT_DB = "./censys_state.sqlite"
 
@@ -23,16 +26,74 @@ CREATE TABLE IF NOT EXISTS job_state (
 );
 """
 
-def _connect(db_path: str) -> sqlite3.Connection:
-    """Connect to the SQLite database with WAL mode."""
+# Kept as constants so sqlite3's per-connection statement cache reuses the prepared statements
+SELECT_STATE = "SELECT job_id, query, idx, fields, cursor, total, updated_at FROM job_state WHERE job_id = ?"
+
+UPSERT_STATE = """
+INSERT INTO job_state (job_id, query, idx, fields, cursor, total, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(job_id) DO UPDATE SET
+    cursor=excluded.cursor,
+    total=excluded.total,
+    updated_at=excluded.updated_at
+"""
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA mmap_size=268435456;",
+)
+
+def open_db(db_path: str) -> sqlite3.Connection:
+    """Open the state database with WAL mode and memory-mapped reads.
+
+    Open it once per run and pass the connection to ``get_state`` and
+    ``upsert_state``; the caller is responsible for closing it.
+    """
     conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     conn.execute(DDL)
     return conn
 
+# Connections opened for path-based calls, one per database file
+_CONN_CACHE: Dict[str, sqlite3.Connection] = {}
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Return the process-wide connection for ``db_path``, opening it on first use."""
+    conn = _CONN_CACHE.get(db_path)
+    if conn is None:
+        conn = _CONN_CACHE[db_path] = open_db(db_path)
+    return conn
+
+@atexit.register
+def _close_cached() -> None:
+    """Close every cached connection."""
+    while _CONN_CACHE:
+        _, conn = _CONN_CACHE.popitem()
+        conn.close()
+
+def _resolve(db: Union[str, sqlite3.Connection]) -> sqlite3.Connection:
+    """Return ``db`` if it is a connection, else the cached connection for that path."""
+    return db if isinstance(db, sqlite3.Connection) else _connect(db)
+
+# Prefix marking BLAKE2b job IDs; unprefixed IDs are legacy SHA-1 digests
+JOB_ID_PREFIX = "b2:"
+
 def make_job_id(index: str, query: str, fields: Optional[list]) -> str:
     """Generate a unique job ID based on index, query, and fields."""
+    key = fastjson.dumps_sorted({
+        "index": index,
+        "query": query,
+        "fields": fields or []
+    })
+    return JOB_ID_PREFIX + hashlib.blake2b(key, digest_size=20).hexdigest()
+
+def make_legacy_job_id(index: str, query: str, fields: Optional[list]) -> str:
+    """Generate the SHA-1 job ID used before ``make_job_id`` switched to BLAKE2b.
+
+    Only used to resume jobs recorded by older versions.
+    """
     key = json.dumps({
         "index": index,
         "query": query,
@@ -40,40 +101,67 @@ def make_job_id(index: str, query: str, fields: Optional[list]) -> str:
     }, sort_keys=True).encode("utf-8")
     return hashlib.sha1(key).hexdigest()
 
-def get_state(db_path: str, job_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieve job state from the database."""
-    conn = _connect(db_path)
-    try:
-        cur = conn.execute("SELECT job_id, query, idx, fields, cursor, total, updated_at FROM job_state WHERE job_id = ?", (job_id,))
-        row = cur.fetchone()
-        if not row:
-            return None
-        return {
-            "job_id": row[0],
-            "query": row[1],
-            "index": row[2],
-            "fields": json.loads(row[3]) if row[3] else None,
-            "cursor": row[4],
-            "total": row[5],
-            "updated_at": row[6],
-        }
-    finally:
-        conn.close()
+def get_state(db: Union[str, sqlite3.Connection], job_id: str) -> Optional[Dict[str, Any]]:
+    """Retrieve job state from the database.
+
+    ``db`` is a connection from ``open_db`` or a database path; paths share
+    one cached connection per process.
+    """
+    row = _resolve(db).execute(SELECT_STATE, (job_id,)).fetchone()
+    if not row:
+        return None
+    return {
+        "job_id": row[0],
+        "query": row[1],
+        "index": row[2],
+        "fields": fastjson.loads(row[3]) if row[3] else None,
+        "cursor": row[4],
+        "total": row[5],
+        "updated_at": row[6],
+    }
+
+def upsert_state(db: Union[str, sqlite3.Connection], job_id: str, index: str, query: str, fields: Optional[list], cursor: Optional[str], total: int) -> None:
+    """Insert or update job state in the database.
+
+    ``db`` is a connection from ``open_db`` or a database path.
+    """
+    now = datetime.utcnow().isoformat() + "Z"
+    fields_json = fastjson.dumps(fields).decode("utf-8") if fields else None
+    conn = _resolve(db)
+    with conn:
+        conn.execute(UPSERT_STATE, (job_id, query, index, fields_json, cursor, total, now))
+
+# Pages between state writes in StateCheckpoint
+STATE_BATCH_PAGES = 10
+
+class StateCheckpoint:
+    """Keep a job's latest cursor in memory and save it every few pages.
+
+    Each save is one short ``upsert_state`` call, so no write transaction
+    stays open between pages and other runs can share the database.
+    """
+    def __init__(self, db: Union[str, sqlite3.Connection], job_id: str, index: str, query: str,
+                 fields: Optional[list], every: int = STATE_BATCH_PAGES):
+        self.db = db
+        self.job_id = job_id
+        self.index = index
+        self.query = query
+        self.fields = fields
+        self.every = every
+        self.cursor: Optional[str] = None
+        self.total = 0
+        self._unsaved = 0
+
+    def update(self, cursor: Optional[str], total: int) -> None:
+        """Record progress after a page; saves once ``every`` pages have accumulated."""
+        self.cursor = cursor
+        self.total = total
+        self._unsaved += 1
+        if self._unsaved >= self.every:
+            self.save()
 
-def upsert_state(db_path: str, job_id: str, index: str, query: str, fields: Optional[list], cursor: Optional[str], total: int) -> None:
-    """Insert or update job state in the database."""
-    conn = _connect(db_path)
-    try:
-        now = datetime.utcnow().isoformat() + "Z"
-        fields_json = json.dumps(fields) if fields else None
-        conn.execute("""
-            INSERT INTO job_state (job_id, query, idx, fields, cursor, total, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(job_id) DO UPDATE SET
-                cursor=excluded.cursor,
-                total=excluded.total,
-                updated_at=excluded.updated_at
-        """, (job_id, query, index, fields_json, cursor, total, now))
-        conn.commit()
-    finally:
-        conn.close()
\ No newline at end of file
+    def save(self) -> None:
+        """Write the latest recorded progress if any is unsaved."""
+        if self._unsaved:
+            upsert_state(self.db, self.job_id, self.index, self.query, self.fields, self.cursor, self.total)
+            self._unsaved = 0
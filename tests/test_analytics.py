@@ -0,0 +1,134 @@
+"""
+Unit tests for analytics.py.
+Covers buffered event logging, flushing, and method recommendation.
+"""
+import gc
+import sqlite3
+import weakref
+from datetime import datetime, timedelta, timezone
+
+from censys_cli.analytics import Analytics
+
+
+def _count_rows(db_path) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM captcha_metrics").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_events_are_buffered_until_batch_is_full(tmp_path):
+    """Events should only reach the database once the batch fills up."""
+    db_path = str(tmp_path / "analytics.sqlite")
+    analytics = Analytics(db_path, flush_every=3)
+    analytics.log_success("pow", 1.5)
+    analytics.log_failure("2captcha", "timeout")
+    assert _count_rows(db_path) == 0
+    analytics.log_success("pow", 0.5)
+    assert _count_rows(db_path) == 3
+    analytics.close()
+
+
+def test_get_stats_includes_buffered_events(tmp_path):
+    """Reading statistics should flush pending events first."""
+    analytics = Analytics(str(tmp_path / "analytics.sqlite"))
+    analytics.log_success("pow", 2.0)
+    analytics.log_failure("pow", "timeout")
+    stats = analytics.get_stats()
+    assert stats["pow"]["attempts"] == 2
+    assert stats["pow"]["success_rate"] == 0.5
+    analytics.close()
+
+
+def test_close_persists_tail(tmp_path):
+    """Closing the collector should write the remaining buffered events."""
+    db_path = str(tmp_path / "analytics.sqlite")
+    analytics = Analytics(db_path)
+    analytics.log_success("pow", 1.0)
+    analytics.close()
+    assert _count_rows(db_path) == 1
+
+
+def test_recommend_method_prefers_fast_reliable_method(tmp_path):
+    """The recommendation should favour high success rate and low latency."""
+    analytics = Analytics(str(tmp_path / "analytics.sqlite"), stats_ttl=0)
+    assert analytics.recommend_method() == "pow"
+    analytics.log_success("2captcha", 1.0)
+    analytics.log_success("pow", 10.0)
+    assert analytics.recommend_method() == "2captcha"
+    analytics.close()
+
+
+def test_flush_chunks_large_batches(tmp_path):
+    """Batches larger than one multi-row INSERT should be written in full."""
+    db_path = str(tmp_path / "analytics.sqlite")
+    analytics = Analytics(db_path, flush_every=1000)
+    for i in range(450):
+        analytics.log_success("pow", float(i))
+    analytics.flush()
+    assert _count_rows(db_path) == 450
+    analytics.close()
+
+
+def test_get_stats_is_cached_within_ttl(tmp_path):
+    """Repeated reads inside the TTL should reuse the cached aggregation."""
+    analytics = Analytics(str(tmp_path / "analytics.sqlite"))
+    analytics.log_success("pow", 1.0)
+    first = analytics.get_stats()
+    analytics.log_success("pow", 1.0)
+    assert analytics.get_stats() is first
+    assert analytics.recommend_method() == "pow"
+    analytics.log_success("2captcha", 0.1)
+    assert analytics.recommend_method() == "pow"
+    analytics.close()
+
+
+def test_unclosed_collector_is_released_and_flushed(tmp_path):
+    """Dropping the last reference flushes pending events without an explicit close()."""
+    db_path = str(tmp_path / "analytics.sqlite")
+    analytics = Analytics(db_path)
+    analytics.log_success("pow", 1.0)
+    ref = weakref.ref(analytics)
+    del analytics
+    gc.collect()
+    assert ref() is None
+    assert _count_rows(db_path) == 1
+
+
+def test_legacy_text_timestamps_are_migrated(tmp_path):
+    """Databases with the old TEXT timestamp column are converted to epoch nanoseconds."""
+    db_path = str(tmp_path / "analytics.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE captcha_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            method TEXT NOT NULL,
+            success INTEGER NOT NULL,
+            response_time REAL,
+            error_message TEXT,
+            timestamp TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_metrics_method_success_rt ON captcha_metrics (method, success, response_time)")
+    conn.executemany(
+        "INSERT INTO captcha_metrics (method, success, response_time, error_message, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [("pow", 1, 1.0, None, "2024-01-02T03:04:05.000006Z"), ("pow", 0, None, "timeout", "1700000000000000000")],
+    )
+    conn.commit()
+    conn.close()
+
+    analytics = Analytics(db_path)
+    analytics.log_success("2captcha", 2.0)
+    analytics.close()
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT id, typeof(timestamp), timestamp FROM captcha_metrics ORDER BY id").fetchall()
+    index = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'captcha_metrics'").fetchall()
+    conn.close()
+    assert [r[:2] for r in rows] == [(1, "integer"), (2, "integer"), (3, "integer")]
+    expected = datetime(2024, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+    assert rows[0][2] == 1704164645000006000
+    assert abs(datetime.fromtimestamp(rows[0][2] / 1e9, tz=timezone.utc) - expected) < timedelta(microseconds=1)
+    assert rows[1][2] == 1700000000000000000
+    assert index == [("idx_metrics_method_success_rt",)]
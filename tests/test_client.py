@@ -0,0 +1,86 @@
+"""
+Unit tests for client.py.
+Covers response decoding, retry handling, and cursor extraction.
+"""
+from unittest import mock
+
+import pytest
+
+from censys_cli.client import CensysClient
+from censys_cli.utils import fastjson
+
+
+def _response(status: int, body: bytes = b"{}", headers=None):
+    resp = mock.Mock()
+    resp.status_code = status
+    resp.content = body
+    resp.headers = headers or {}
+    return resp
+
+
+def _client(**kwargs) -> CensysClient:
+    client = CensysClient(api_key="key", max_retries=2, backoff_base=0, **kwargs)
+    client._session = mock.Mock()
+    return client
+
+
+def test_search_returns_hits_and_next_cursor():
+    """A 2xx response is decoded once and split into hits and cursor."""
+    client = _client()
+    client._session.request.return_value = _response(
+        200, b'{"result": {"hits": [{"ip": "1.2.3.4"}], "links": {"next": "abc"}}}'
+    )
+    hits, cursor = client.search("hosts", "q")
+    assert hits == [{"ip": "1.2.3.4"}]
+    assert cursor == "abc"
+
+
+@mock.patch("censys_cli.client.time.sleep")
+def test_request_retries_server_errors(mock_sleep):
+    """5xx and 429 responses are retried before a success is returned."""
+    client = _client()
+    client._session.request.side_effect = [
+        _response(503),
+        _response(429, headers={"Retry-After": "0"}),
+        _response(200, b'{"result": {"hits": []}}'),
+    ]
+    hits, cursor = client.search("hosts", "q")
+    assert hits == []
+    assert cursor is None
+    assert client._session.request.call_count == 3
+
+
+@mock.patch("censys_cli.client.time.sleep")
+def test_request_gives_up_after_max_retries(mock_sleep):
+    """Client errors surface as RuntimeError once retries are exhausted."""
+    client = _client()
+    client._session.request.return_value = _response(403, b'{"error": "forbidden"}')
+    with pytest.raises(RuntimeError, match="403"):
+        client.search("hosts", "q")
+    assert client._session.request.call_count == 3
+
+
+def test_basic_auth_is_attached_to_session_once():
+    """ID/secret credentials are configured on the session, not per request."""
+    client = CensysClient(api_id="id", api_secret="secret")
+    assert client._session.auth.username == "id"
+    assert "Authorization" not in client._session.headers
+    client.close()
+
+    client = CensysClient(api_key="key", org_id="org")
+    assert client._session.auth is None
+    assert client._session.headers["Authorization"] == "Bearer key"
+    assert client._session.headers["Censys-Organization-Id"] == "org"
+    client.close()
+
+
+def test_wide_integers_survive_decoding_and_reencoding():
+    """Integers beyond 64 bits must stay exact through the JSON fast path."""
+    client = _client()
+    client._session.request.return_value = _response(
+        200, b'{"result": {"hits": [{"id": 123456789012345678901234567890, "n": 1.5}]}}'
+    )
+    hits, _ = client.search("hosts", "q")
+    assert hits == [{"id": 123456789012345678901234567890, "n": 1.5}]
+    assert fastjson.dumps(hits[0]) == b'{"id":123456789012345678901234567890,"n":1.5}'
+    assert fastjson.loads('{"id": -99999999999999999999}') == {"id": -99999999999999999999}
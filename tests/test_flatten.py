@@ -0,0 +1,99 @@
+"""
+Unit tests for utils/flatten.py.
+Covers flattening nested records and selecting fields by path.
+"""
+from censys_cli.utils.flatten import FlattenHelper
+
+HOST = {
+    "ip": "1.2.3.4",
+    "location": {"country_code": "IT", "city": None},
+    "services": [{"port": 22, "service_name": "SSH"}, {"port": 443, "labels": []}],
+    "dns": {"names": []},
+}
+
+
+def test_flatten_uses_dot_and_index_notation():
+    """Nested dicts use dots, lists use [i], empty lists become ''."""
+    assert FlattenHelper.flatten(HOST) == {
+        "ip": "1.2.3.4",
+        "location.country_code": "IT",
+        "location.city": "",
+        "services[0].port": 22,
+        "services[0].service_name": "SSH",
+        "services[1].port": 443,
+        "services[1].labels": "",
+        "dns.names": "",
+    }
+
+
+def test_select_fields_follows_paths():
+    """Dotted and indexed paths resolve; missing steps yield None."""
+    fields = ["ip", "location.country_code", "services[1].port", "services[5].port", "nope.x"]
+    assert FlattenHelper.select_fields(HOST, fields) == {
+        "ip": "1.2.3.4",
+        "location.country_code": "IT",
+        "services[1].port": 443,
+        "services[5].port": None,
+        "nope.x": None,
+    }
+
+
+def test_compile_fields_matches_select_fields():
+    """Compiled selectors agree with select_fields for nested and top-level paths."""
+    for fields in (["ip", "location.country_code", "services[0].port"], ["ip", "missing"]):
+        select = FlattenHelper.compile_fields(fields)
+        assert select(HOST) == FlattenHelper.select_fields(HOST, fields)
+
+
+def test_flatten_handles_deep_nesting():
+    """Deeply nested records flatten without hitting the recursion limit."""
+    record = leaf = {}
+    for _ in range(5000):
+        leaf["a"] = {}
+        leaf = leaf["a"]
+    leaf["b"] = 1
+    flat = FlattenHelper.flatten(record)
+    assert list(flat.values()) == [1]
+    assert next(iter(flat)).count(".") == 5000
+
+
+def test_select_fields_precompiled_matches_select_fields():
+    """Pre-tokenized paths give the same result, including index-like names."""
+    fields = ["services[0].service_name", "[0]", "dns.names[0]", "location"]
+    tokenized = FlattenHelper.tokenize_fields(fields)
+    assert tokenized[0] == ("services[0].service_name", ("services", 0, "service_name"))
+    assert FlattenHelper.select_fields_precompiled(HOST, tokenized) == FlattenHelper.select_fields(HOST, fields)
+    assert FlattenHelper.select_fields(HOST, ["[0]"]) == {"[0]": None}
+
+
+def test_iter_flatten_yields_flatten_items_in_order():
+    """iter_flatten streams exactly the pairs flatten collects."""
+    assert list(FlattenHelper.iter_flatten(HOST)) == list(FlattenHelper.flatten(HOST).items())
+
+
+def test_stringify_renders_containers_as_json():
+    """Containers become compact JSON; scalars and None keep their plain form."""
+    assert FlattenHelper.stringify({"ports": [22, 80], "tls": None, "city": "Zürich"}) == \
+        '{"ports":[22,80],"tls":null,"city":"Zürich"}'
+    assert FlattenHelper.stringify((1, "a")) == '[1,"a"]'
+    assert FlattenHelper.stringify(None) == ""
+    assert FlattenHelper.stringify(3.5) == "3.5"
+
+
+def test_flatten_long_scalar_lists():
+    """Long all-scalar lists produce the same indexed keys as the generic walk."""
+    ports = list(range(40))
+    mixed = [1, "a", 2.5, True] * 5 + [{"x": 1}]
+    flat = FlattenHelper.flatten({"ports": ports, "mixed": mixed})
+    assert [flat[f"ports[{i}]"] for i in range(40)] == ports
+    assert flat["mixed[3]"] is True and flat["mixed[20].x"] == 1
+    assert list(flat)[:2] == ["ports[0]", "ports[1]"]
+
+
+def test_flatten_already_flat_records():
+    """Flat records come back as a copy, with non-scalar leaves stringified as usual."""
+    rec = {"ip": "1.2.3.4", "port": 22, "score": 0.5}
+    flat = FlattenHelper.flatten(rec)
+    assert flat == rec and flat is not rec
+    assert FlattenHelper.flatten({"ip": "1.2.3.4", "tls": None, "pair": (1, 2)}) == \
+        {"ip": "1.2.3.4", "tls": "", "pair": "[1,2]"}
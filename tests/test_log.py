@@ -0,0 +1,42 @@
+"""
+Unit tests for utils/log.py.
+Covers JSON formatting of structured log records.
+"""
+import json
+import logging
+
+from censys_cli.utils.log import JsonFormatter, get_logger
+
+
+def _record(**extra) -> logging.LogRecord:
+    record = logging.LogRecord("censys_cli", logging.INFO, __file__, 1, "page_done", None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extras_only():
+    """Standard attributes are dropped; extras and private-name filtering apply."""
+    data = json.loads(JsonFormatter().format(_record(page=2, total=200, _hidden=1)))
+    assert data == {"level": "info", "msg": "page_done", "page": 2, "total": 200}
+
+
+def test_json_formatter_keeps_non_ascii():
+    """Non-ASCII values are written as-is rather than escaped."""
+    line = JsonFormatter().format(_record(query="città"))
+    assert "città" in line
+
+
+def test_file_log_flushes_on_error_and_close(tmp_path):
+    """The log file is opened lazily; INFO records stay buffered until an ERROR or close."""
+    logfile = tmp_path / "run.log"
+    logger = get_logger("censys_cli_test", str(logfile))
+    assert not logfile.exists()
+    logger.info("page_done", extra={"page": 1})
+    assert logfile.read_text(encoding="utf-8") == ""
+    logger.error("output_write_failed")
+    lines = logfile.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["msg"] for line in lines] == ["page_done", "output_write_failed"]
+    logger.info("completed")
+    for handler in logger.handlers:
+        handler.close()
+    assert json.loads(logfile.read_text(encoding="utf-8").splitlines()[-1])["msg"] == "completed"
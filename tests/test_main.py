@@ -6,7 +6,10 @@ with ``--dry-run`` exits early without invoking network calls. Because
 API calls require live credentials and network access, we rely on mocks
 to simulate success conditions.
 """
-import os
+import csv
+import io
+import json
+import logging
 import sys
 from unittest import mock
 
@@ -57,9 +60,10 @@ def test_parse_args_custom():
     assert args.fields == ["ip", "location.country_code"]
 
 
-def test_main_dry_run():
+def test_main_dry_run(tmp_path, monkeypatch):
     """Running with --dry-run should exit without calling the API or browser."""
-    test_argv = ["prog", "-q", "dummy", "--dry-run"]
+    monkeypatch.setenv("CENSYS_STATE_DB", str(tmp_path / "state.sqlite"))
+    test_argv = ["prog", "-q", "dummy", "--dry-run", "--log-file", str(tmp_path / "run.log")]
     with mock.patch.object(sys, "argv", test_argv):
         # Mock out CensysClient and browser fallback to ensure they are not called
         with mock.patch("censys_cli.main.CensysClient") as mock_client:
@@ -70,13 +74,15 @@ def test_main_dry_run():
         mock_browser.assert_not_called()
 
 
-def test_main_api_invocation(tmp_path):
+def test_main_api_invocation(tmp_path, monkeypatch):
     """Ensure that the API client is invoked and output is written when not dry-run."""
-    # Set up environment and temporary output
+    # Set up environment and temporary output; state and logs stay out of the working tree
     tmp_output = tmp_path / "out.json"
-    test_argv = ["prog", "-q", "dummy", "--format", "json", "-o", str(tmp_output)]
+    test_argv = ["prog", "-q", "dummy", "--format", "json", "-o", str(tmp_output),
+                 "--log-file", str(tmp_path / "run.log")]
+    monkeypatch.setenv("CENSYS_STATE_DB", str(tmp_path / "state.sqlite"))
     # Provide fake API key so that CLI attempts API path
-    os.environ["CENSYS_API_KEY"] = "dummy"
+    monkeypatch.setenv("CENSYS_API_KEY", "dummy")
     with mock.patch.object(sys, "argv", test_argv):
         # Mock the CensysClient.search method to return a synthetic response
         fake_client = mock.MagicMock()
@@ -87,3 +93,73 @@ def test_main_api_invocation(tmp_path):
         assert tmp_output.exists()
         contents = tmp_output.read_text().strip().split("\n")
         assert contents  # at least one line
+
+
+def test_prefetch_pages_follows_cursor_chain():
+    """Pages should be yielded in order and stop when the cursor runs out."""
+    fake_client = mock.MagicMock()
+    fake_client.search.side_effect = [
+        ([{"ip": "1.1.1.1"}], "c1"),
+        ([{"ip": "2.2.2.2"}], "c2"),
+        ([{"ip": "3.3.3.3"}], None),
+    ]
+    pages = list(cli_main.prefetch_pages(fake_client, "hosts", "q", 100, None, float("inf")))
+    assert [p[0][0]["ip"] for p in pages] == ["1.1.1.1", "2.2.2.2", "3.3.3.3"]
+    assert [p[1] for p in pages] == ["c1", "c2", None]
+    cursors = [c.kwargs["cursor"] for c in fake_client.search.call_args_list]
+    assert cursors == [None, "c1", "c2"]
+
+
+def test_prefetch_pages_respects_limit_and_propagates_errors():
+    """The producer should honour max_pages and surface search errors."""
+    fake_client = mock.MagicMock()
+    fake_client.search.side_effect = lambda *a, cursor=None, **kw: ([{"ip": "1.1.1.1"}], f"{cursor}+")
+    assert len(list(cli_main.prefetch_pages(fake_client, "hosts", "q", 100, "start", 2))) == 2
+    assert fake_client.search.call_count == 2
+
+    fake_client.search.side_effect = RuntimeError("boom")
+    with pytest.raises(RuntimeError, match="boom"):
+        list(cli_main.prefetch_pages(fake_client, "hosts", "q", 100, None, 5))
+
+
+def test_csv_row_builder_orders_and_fills_cells():
+    """Rows should follow the header order, with blanks for missing columns."""
+    build = cli_main.csv_row_builder(["ip", "port", "missing"], stringify=False)
+    assert build({"port": 22, "ip": "1.2.3.4"}) == ["1.2.3.4", "22", ""]
+
+    build = cli_main.csv_row_builder(["ip", "ports", "asn"], stringify=True)
+    assert build({"ip": "1.2.3.4", "ports": [22, 80], "asn": None}) == ["1.2.3.4", "[22,80]", ""]
+
+
+def test_write_csv_rows_matches_csv_module():
+    """The fast path must produce exactly what csv.writer would."""
+    rows = [
+        ["1.2.3.4", "22", "US"],
+        ["5.6.7.8", "a,b", 'say "hi"'],
+        ["", "", ""],
+        ["line\nbreak", "80", "DE"],
+    ]
+    expected = io.StringIO()
+    csv.writer(expected).writerows(rows)
+    actual = io.StringIO()
+    cli_main.write_csv_rows(actual, csv.writer(actual), iter(rows), 3)
+    assert actual.getvalue() == expected.getvalue()
+
+    single = io.StringIO()
+    cli_main.write_csv_rows(single, csv.writer(single), iter([[""], ["x"]]), 1)
+    assert single.getvalue() == '""\r\nx\r\n'
+
+
+def test_job_start_logs_cli_args(tmp_path, monkeypatch):
+    """CLI arguments are logged under "cli_args"; "args" would clash with LogRecord.args."""
+    monkeypatch.setenv("CENSYS_STATE_DB", str(tmp_path / "state.sqlite"))
+    log_file = tmp_path / "run.log"
+    test_argv = ["prog", "-q", "dummy", "--dry-run", "--log-file", str(log_file)]
+    with mock.patch.object(sys, "argv", test_argv):
+        with pytest.raises(SystemExit):
+            cli_main.main()
+    for handler in logging.getLogger("censys_cli").handlers:
+        handler.flush()
+    record = json.loads(log_file.read_text(encoding="utf-8").splitlines()[0])
+    assert record["msg"] == "job_start"
+    assert record["cli_args"]["query"] == "dummy"
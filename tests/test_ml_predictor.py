@@ -0,0 +1,135 @@
+"""
+Unit tests for ml_predictor.py.
+Covers training on recorded CAPTCHA metrics and method recommendation.
+"""
+import os
+import sqlite3
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from censys_cli.analytics import Analytics
+from censys_cli.ml_predictor import MLPredictor
+
+
+
+def _seed(db_path: str) -> None:
+    """Record a history where 2captcha succeeds far more often than pow."""
+    analytics = Analytics(db_path)
+    for i in range(40):
+        analytics.log_success("2captcha", 2.0 + (i % 3))
+        if i % 4:
+            analytics.log_failure("pow", "timeout: no token")
+        else:
+            analytics.log_success("pow", 1.0)
+    analytics.close()
+
+
+def test_recommend_fast_uses_smoothed_success_rate(tmp_path):
+    """The default predictor compares Beta(1,1)-smoothed rates and breaks ties towards PoW."""
+    db_path = str(tmp_path / "analytics.sqlite")
+    predictor = MLPredictor(db_path)
+    assert predictor.recommend() == "pow"
+    _seed(db_path)
+    assert predictor.train() is False
+    assert predictor.recommend() == "2captcha"
+
+    tied = str(tmp_path / "tied.sqlite")
+    analytics = Analytics(tied)
+    analytics.log_success("pow", 1.0)
+    analytics.log_success("2captcha", 1.0)
+    analytics.close()
+    assert MLPredictor(tied).recommend_fast() == "pow"
+
+
+def test_recommend_defaults_to_pow_without_data(tmp_path):
+    """An untrained Random Forest predictor falls back to PoW."""
+    predictor = MLPredictor(str(tmp_path / "analytics.sqlite"), use_rf=True)
+    assert predictor.train() is False
+    assert predictor.recommend() == "pow"
+
+
+def test_recommend_uses_cached_training_data(tmp_path):
+    """After training, recommend() works from cached values without re-reading the table."""
+    pytest.importorskip("sklearn")
+    db_path = str(tmp_path / "analytics.sqlite")
+    _seed(db_path)
+    predictor = MLPredictor(db_path, use_rf=True)
+    assert predictor.train() is True
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM captcha_metrics")
+    conn.commit()
+    conn.close()
+    assert predictor.recommend() == "2captcha"
+
+
+def test_train_async_is_awaited_by_recommend(tmp_path):
+    """recommend() blocks on a pending background training run."""
+    pytest.importorskip("sklearn")
+    db_path = str(tmp_path / "analytics.sqlite")
+    _seed(db_path)
+    predictor = MLPredictor(db_path, use_rf=True)
+    future = predictor.train_async()
+    assert predictor.recommend() == "2captcha"
+    assert future.done() and future.result() is True
+
+
+def test_trained_model_is_reused_until_metrics_change(tmp_path):
+    """A second predictor loads the cached model; new metrics force a refit."""
+    pytest.importorskip("sklearn")
+    db_path = str(tmp_path / "analytics.sqlite")
+    _seed(db_path)
+    assert MLPredictor(db_path, use_rf=True).train() is True
+
+    cached = MLPredictor(db_path, use_rf=True)
+    assert cached.load_cached() is True
+    assert cached.recommend() == "2captcha"
+
+    analytics = Analytics(db_path)
+    analytics.log_success("pow", 1.0)
+    analytics.close()
+    assert MLPredictor(db_path, use_rf=True).load_cached() is False
+
+
+def test_import_does_not_load_sklearn():
+    """Importing the predictor must not pull in scikit-learn until training."""
+    code = ("import sys, censys_cli.ml_predictor as m; m.MLPredictor(); "
+            "assert 'sklearn' not in sys.modules and 'numpy' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_unexpected_cache_contents_are_ignored(tmp_path):
+    """A cache file that is not a model dict is treated as a cache miss."""
+    joblib = pytest.importorskip("joblib")
+    pytest.importorskip("sklearn")
+    db_path = str(tmp_path / "analytics.sqlite")
+    _seed(db_path)
+    predictor = MLPredictor(db_path, use_rf=True)
+    for junk in (["not", "a", "dict"], {"model": None}):
+        joblib.dump(junk, predictor.cache_path)
+        assert predictor.load_cached() is False
+    assert predictor.train() is True
+
+
+def test_cache_writable_by_others_is_not_loaded(tmp_path):
+    """The pickled model is only unpickled when other users cannot have written it."""
+    pytest.importorskip("joblib")
+    pytest.importorskip("sklearn")
+    db_path = str(tmp_path / "analytics.sqlite")
+    _seed(db_path)
+    predictor = MLPredictor(db_path, use_rf=True)
+    assert predictor.train() is True
+    assert stat.S_IMODE(os.stat(predictor.cache_path).st_mode) == 0o600
+    assert MLPredictor(db_path, use_rf=True).load_cached() is True
+
+    os.chmod(predictor.cache_path, 0o666)
+    assert MLPredictor(db_path, use_rf=True).load_cached() is False
+
+    os.chmod(predictor.cache_path, 0o600)
+    link = tmp_path / "linked.sqlite.mlcache.pkl"
+    link.symlink_to(predictor.cache_path)
+    linked = MLPredictor(db_path, use_rf=True)
+    linked.cache_path = str(link)
+    assert linked.load_cached() is False
@@ -0,0 +1,90 @@
+"""
+Unit tests for utils/state.py.
+Covers job ID generation and persisting/resuming job state.
+"""
+import hashlib
+import json
+
+from censys_cli.utils import state
+from censys_cli.utils.state import get_state, make_job_id, make_legacy_job_id, open_db, upsert_state
+
+
+def test_make_job_id_is_stable_and_field_sensitive():
+    """Job IDs depend on index, query and fields, not on call order."""
+    a = make_job_id("hosts", "services.port: 22", ["ip"])
+    assert a == make_job_id("hosts", "services.port: 22", ["ip"])
+    assert a != make_job_id("hosts", "services.port: 22", None)
+    assert a != make_job_id("certificates", "services.port: 22", ["ip"])
+
+
+def test_state_round_trip_with_shared_connection(tmp_path):
+    """State written through a shared connection is read back unchanged."""
+    conn = open_db(str(tmp_path / "state.sqlite"))
+    assert get_state(conn, "job") is None
+    upsert_state(conn, "job", "hosts", "q", ["ip"], "cursor1", 100)
+    upsert_state(conn, "job", "hosts", "q", ["ip"], "cursor2", 200)
+    state = get_state(conn, "job")
+    conn.close()
+    assert state["cursor"] == "cursor2"
+    assert state["total"] == 200
+    assert state["fields"] == ["ip"]
+    assert state["index"] == "hosts"
+
+
+def test_state_accepts_database_path(tmp_path):
+    """Passing a path instead of a connection keeps working."""
+    db_path = str(tmp_path / "state.sqlite")
+    upsert_state(db_path, "job", "hosts", "q", None, "c", 5)
+    state = get_state(db_path, "job")
+    assert state["cursor"] == "c"
+    assert state["fields"] is None
+
+
+def test_path_based_calls_share_one_connection(tmp_path):
+    """Repeated path-based calls reuse a cached connection."""
+    db_path = str(tmp_path / "state.sqlite")
+    upsert_state(db_path, "job", "hosts", "q", None, "c1", 1)
+    conn = state._CONN_CACHE[db_path]
+    upsert_state(db_path, "job", "hosts", "q", None, "c2", 2)
+    assert state._CONN_CACHE[db_path] is conn
+    assert get_state(db_path, "job")["cursor"] == "c2"
+
+
+def test_job_ids_are_blake2b_with_legacy_fallback():
+    """New IDs carry the b2: prefix; legacy IDs match the old SHA-1 scheme."""
+    job_id = make_job_id("hosts", "q", ["ip"])
+    assert job_id.startswith("b2:") and len(job_id) == 3 + 40
+    old_key = json.dumps({"index": "hosts", "query": "q", "fields": ["ip"]}, sort_keys=True)
+    assert make_legacy_job_id("hosts", "q", ["ip"]) == hashlib.sha1(old_key.encode("utf-8")).hexdigest()
+
+
+def test_job_id_does_not_depend_on_json_backend():
+    """The hashed key must match the stdlib encoding so IDs survive orjson being absent."""
+    fields = ["ip", "services.port"]
+    stdlib_key = json.dumps({"index": "hosts", "query": "città", "fields": fields},
+                            sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    expected = "b2:" + hashlib.blake2b(stdlib_key.encode("utf-8"), digest_size=20).hexdigest()
+    assert make_job_id("hosts", "città", fields) == expected
+
+
+def test_checkpoint_saves_every_n_pages(tmp_path):
+    """Progress is written every N updates and on save(); no transaction is left open."""
+    db_path = str(tmp_path / "state.sqlite")
+    conn = open_db(db_path)
+    other = open_db(db_path)
+    checkpoint = state.StateCheckpoint(conn, "job", "hosts", "q", None, every=3)
+    for page in range(1, 4):
+        checkpoint.update(f"c{page}", page)
+        if page < 3:
+            assert get_state(other, "job") is None
+        # Another run can still write while progress is pending
+        upsert_state(other, "other-job", "hosts", "q", None, "x", page)
+    assert get_state(other, "job")["cursor"] == "c3"
+
+    checkpoint.update("c4", 4)
+    assert get_state(other, "job")["cursor"] == "c3"
+    checkpoint.save()
+    assert get_state(other, "job")["cursor"] == "c4"
+    assert not conn.in_transaction
+    conn.close()
+    other.close()